@@ -4,23 +4,119 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import plotly.express as px
+from plotly.subplots import make_subplots
+import re
 import time
-import locale
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache, partial
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from scipy.stats import linregress
 
-# Configurar formato europeo
-import locale
-try:
-    locale.setlocale(locale.LC_ALL, 'es_ES.UTF-8')
-except:
-    locale.setlocale(locale.LC_ALL, '')
+from utils._njit import HAVE_NUMBA
+from utils.kernels import (
+    ema_tail_std_batch, hist_orders, macd_kernel, mc_qty,
+    rolling_mean_std, rsi_loop, rsi_multi,
+)
+
+# Formato europeo (miles "." y decimal ",") sin pasar por el módulo locale:
+# locale.format_string toma el lock de LC_NUMERIC en cada llamada y el panel
+# formatea decenas de valores por refresco
+_THOUSANDS = "."
+_DECIMAL = ","
+
+
+def _fast_fmt(fmt, x):
+    s = fmt % x
+    i, _, d = s.partition(".")
+    i = re.sub(r"(?<=\d)(?=(\d{3})+$)", _THOUSANDS, i)
+    return f"{i}{_DECIMAL}{d}" if d else i
+
+
+# Atajos para las dos precisiones que usa todo el panel
+fmt2 = partial(_fast_fmt, "%.2f")
+fmt4 = partial(_fast_fmt, "%.4f")
+
+
+@lru_cache(maxsize=None)
+def _trend_grid(n):
+    # La rejilla x centrada y su suma de cuadrados solo dependen del tamaño de
+    # la ventana (30 en la práctica): se calculan una vez por proceso
+    dx = np.arange(n) - (n - 1) / 2.0
+    return dx, float((dx * dx).sum())
+
+
+# Horizonte de proyección y simulación: 80 días hábiles (~4 meses). Las raíces
+# se calculan una vez al importar, no en cada refresco
+DAYS_AHEAD = 80
+SQRT_HORIZON = np.sqrt(DAYS_AHEAD / 252)  # escala la σ diaria al horizonte
+SQRT_DAYS_AHEAD = np.sqrt(DAYS_AHEAD)
+
+
+def _proj_ci(emas, tail_stds, slopes, stds):
+    # Proyección e intervalo de confianza en una sola expresión vectorizada:
+    # deriva por pendiente, banda de ±1σ de la cola y σ histórica escalada
+    drift = slopes * DAYS_AHEAD
+    half = stds * SQRT_HORIZON
+    return emas + drift, (emas - tail_stds) + drift - half, (emas + tail_stds) + drift + half
+
+
+# Generador PCG64 y buffer de shocks para Monte Carlo, creados una vez por
+# rerun: standard_normal(out=...) rellena el buffer sin asignar 4×n_sim arrays
+_MC_RNG = np.random.default_rng(42)
+_MC_SHOCKS = np.empty((4, 1000))
+
+
+_ORDER_COLUMNS = [
+    "Budget CNY", "Copper Budget CNY", "Other Budget CNY", "Copper Price CNY",
+    "Transport Cost CNY", "Other Cost CNY", "Copper Quantity lb",
+    "Copper Quantity ton", "Total Order Cost CNY", "Budget Status CNY"
+]
 
 
 # Configuración de página
 st.set_page_config(layout="wide")
 st.title("Dashboard: Análisis de Pedido desde China (100.000 EUR)")
 
+
+@st.cache_data(ttl=3600)
+def fetch_historical_data():
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=270)  # 9 meses
+    tickers = ["HG=F", "CL=F", "EURCNY=X", "USDCNY=X"]
+    max_retries = 3
+    for attempt in range(max_retries):
+        try:
+            # Una sola petición para los cuatro tickers en lugar de cuatro llamadas secuenciales
+            data = yf.download(tickers, start=start_date, end=end_date, interval="1d", auto_adjust=False, group_by="ticker", threads=True, progress=False)
+            copper = data["HG=F"].dropna(how="all")
+            oil = data["CL=F"].dropna(how="all")
+            eur_cny = data["EURCNY=X"].dropna(how="all")
+            usd_cny = data["USDCNY=X"].dropna(how="all")
+            if any(df.empty for df in [copper, oil, eur_cny, usd_cny]):
+                st.warning(f"Intento {attempt + 1}: Uno o más conjuntos de datos históricos están vacíos.")
+                time.sleep(2)
+                continue
+            if any(len(df) < 30 for df in [copper, oil, eur_cny, usd_cny]):
+                st.warning(f"Intento {attempt + 1}: Datos insuficientes (menos de 30 filas).")
+                time.sleep(2)
+                continue
+            return copper, oil, eur_cny, usd_cny
+        except Exception as e:
+            st.error(f"Error al obtener datos históricos (intento {attempt + 1}): {e}")
+            time.sleep(2)
+    st.error("No se pudieron obtener datos históricos después de varios intentos.")
+    return pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+
+
+# Datos históricos compartidos por todas las pestañas: una sola descarga, persistida
+# en session_state (clave por fecha) para sobrevivir a desalojos de la caché
+_today = datetime.now().date()
+if st.session_state.get("historical_raw_date") != _today:
+    st.session_state.historical_raw = fetch_historical_data()
+    st.session_state.historical_raw_date = _today
+copper_hist, oil_hist, eur_cny_hist, usd_cny_hist = st.session_state.historical_raw
+
 # Tabs
 tab1, tab2, tab3 = st.tabs(["Dashboard", "Análisis de Compra Pasada", "Explicación"])
 
@@ -98,48 +194,24 @@ with tab1:
     transport_cost_factor = st.sidebar.slider("Factor Coste Transporte (% del precio del petróleo)", 0.1, 10.0, 1.0, help="Porcentaje del precio del petróleo que representa los costes de transporte")
     refresh_rate = st.sidebar.slider("Tasa de Refresco (segundos)", 10, 300, 180)  # Default to 180 seconds (3 minutes)
 
-    # Estado de sesión
+    # Estado de sesión: deques acotados, el tope de 100 puntos lo impone el contenedor
     if "data" not in st.session_state:
         st.session_state.data = {
-            "copper": [], "oil": [], "eur_cny": [], "usd_cny": [], "copper_quantity_ton": [], "timestamps": []
+            k: deque(maxlen=100) for k in ("copper", "oil", "eur_cny", "usd_cny", "copper_quantity_ton", "timestamps")
         }
 
-    @st.cache_data(ttl=3600)
-    def fetch_historical_data():
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=270)  # 9 meses
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                copper = yf.download("HG=F", start=start_date, end=end_date, interval="1d", auto_adjust=False)
-                oil = yf.download("CL=F", start=start_date, end=end_date, interval="1d", auto_adjust=False)
-                eur_cny = yf.download("EURCNY=X", start=start_date, end=end_date, interval="1d", auto_adjust=False)
-                usd_cny = yf.download("USDCNY=X", start=start_date, end=end_date, interval="1d", auto_adjust=False)
-                if any(df.empty for df in [copper, oil, eur_cny, usd_cny]):
-                    st.warning(f"Intento {attempt + 1}: Uno o más conjuntos de datos históricos están vacíos.")
-                    time.sleep(2)
-                    continue
-                if any(len(df) < 30 for df in [copper, oil, eur_cny, usd_cny]):
-                    st.warning(f"Intento {attempt + 1}: Datos insuficientes (menos de 30 filas).")
-                    time.sleep(2)
-                    continue
-                return copper, oil, eur_cny, usd_cny
-            except Exception as e:
-                st.error(f"Error al obtener datos históricos (intento {attempt + 1}): {e}")
-                time.sleep(2)
-        st.error("No se pudieron obtener datos históricos después de varios intentos.")
-        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+    @st.cache_data(ttl=60, show_spinner=False)
+    def _get_last_price(symbol):
+        history = yf.Ticker(symbol).history(period="1d", interval="1m")
+        return float(history["Close"].to_numpy()[-1]) if not history.empty else np.nan
 
     def fetch_realtime_data():
+        symbols = ["HG=F", "CL=F", "EURCNY=X", "USDCNY=X"]
         try:
-            copper = yf.Ticker("HG=F").history(period="1d", interval="1m")
-            copper_price = float(copper["Close"].iloc[-1]) if not copper.empty else np.nan
-            oil = yf.Ticker("CL=F").history(period="1d", interval="1m")
-            oil_price = float(oil["Close"].iloc[-1]) if not oil.empty else np.nan
-            eur_cny = yf.Ticker("EURCNY=X").history(period="1d", interval="1m")
-            eur_cny_price = float(eur_cny["Close"].iloc[-1]) if not eur_cny.empty else np.nan
-            usd_cny = yf.Ticker("USDCNY=X").history(period="1d", interval="1m")
-            usd_cny_price = float(usd_cny["Close"].iloc[-1]) if not usd_cny.empty else np.nan
+            # Las cuatro peticiones en paralelo: la latencia pasa a ser la máxima, no la suma.
+            # La caché de 60s evita repetir llamadas HTTP cuando el rerun viene de un cambio de UI.
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                copper_price, oil_price, eur_cny_price, usd_cny_price = list(executor.map(_get_last_price, symbols))
             timestamp = datetime.now()
             return copper_price, oil_price, eur_cny_price, usd_cny_price, timestamp
         except Exception as e:
@@ -153,91 +225,155 @@ with tab1:
         st.session_state.data["usd_cny"].append(usd_cny_price)
         st.session_state.data["copper_quantity_ton"].append(copper_quantity_ton)
         st.session_state.data["timestamps"].append(timestamp)
-        for key in st.session_state.data:
-            st.session_state.data[key] = st.session_state.data[key][-100:]
 
     def calculate_order(budget_eur, copper_pct, transport_factor, copper_price, oil_price, eur_cny_price, usd_cny_price):
-        if any(np.isnan(x) for x in [copper_price, oil_price, eur_cny_price, usd_cny_price]):
-            return np.nan, np.nan, np.nan, np.nan, np.nan, np.nan, np.nan, np.nan, np.nan
+        # Acepta escalares o arrays NumPy (toda la aritmética es elemento a elemento);
+        # cualquier entrada NaN produce NaN en todas las salidas, como antes
+        invalid = np.isnan(copper_price) | np.isnan(oil_price) | np.isnan(eur_cny_price) | np.isnan(usd_cny_price)
         budget_cny = budget_eur * eur_cny_price
         copper_budget_cny = budget_cny * (copper_pct / 100)
         other_budget_cny = budget_cny * (1 - copper_pct / 100)
         copper_price_cny = copper_price * usd_cny_price
         oil_price_cny = oil_price * usd_cny_price
-        copper_quantity_lb = copper_budget_cny / copper_price_cny if copper_price_cny != 0 else np.nan
-        copper_quantity_ton = copper_quantity_lb * 0.000453592 if not np.isnan(copper_quantity_lb) else np.nan
-        transport_cost_cny = oil_price_cny * transport_factor / 100 if not np.isnan(oil_price_cny) else 0
-        other_cost_cny = other_budget_cny - transport_cost_cny if other_budget_cny >= transport_cost_cny else 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            copper_quantity_lb = np.where(copper_price_cny != 0, copper_budget_cny / copper_price_cny, np.nan)
+        copper_quantity_ton = copper_quantity_lb * 0.000453592
+        transport_cost_cny = np.where(np.isnan(oil_price_cny), 0.0, oil_price_cny * transport_factor / 100)
+        other_cost_cny = np.where(other_budget_cny >= transport_cost_cny, other_budget_cny - transport_cost_cny, 0.0)
         total_order_cost_cny = copper_budget_cny + transport_cost_cny + other_cost_cny
         budget_status = budget_cny - total_order_cost_cny
-        return budget_cny, copper_budget_cny, other_budget_cny, copper_quantity_lb, copper_quantity_ton, transport_cost_cny, other_cost_cny, total_order_cost_cny, budget_status
-
-    def calculate_historical_orders(historical_df, budget_eur, copper_pct, transport_factor):
-        historical_df["Budget CNY"] = budget_eur * historical_df["EUR/CNY"]
-        historical_df["Copper Budget CNY"] = historical_df["Budget CNY"] * (copper_pct / 100)
-        historical_df["Other Budget CNY"] = historical_df["Budget CNY"] * (1 - copper_pct / 100)
-        historical_df["Copper Price CNY"] = historical_df["Copper"] * historical_df["USD/CNY"]
-        historical_df["Transport Cost CNY"] = (historical_df["Oil"] * historical_df["USD/CNY"]) * (transport_factor / 100)
-        historical_df["Other Cost CNY"] = historical_df["Other Budget CNY"] - historical_df["Transport Cost CNY"]
-        historical_df["Other Cost CNY"] = historical_df["Other Cost CNY"].clip(lower=0)
-        historical_df["Copper Quantity lb"] = historical_df["Copper Budget CNY"] / historical_df["Copper Price CNY"]
-        historical_df["Copper Quantity ton"] = historical_df["Copper Quantity lb"] * 0.000453592
-        historical_df["Total Order Cost CNY"] = historical_df["Copper Budget CNY"] + historical_df["Transport Cost CNY"] + historical_df["Other Cost CNY"]
-        historical_df["Budget Status CNY"] = historical_df["Budget CNY"] - historical_df["Total Order Cost CNY"]
+        outputs = (budget_cny, copper_budget_cny, other_budget_cny, copper_quantity_lb, copper_quantity_ton,
+                   transport_cost_cny, other_cost_cny, total_order_cost_cny, budget_status)
+        # [()] devuelve el escalar para entradas escalares y deja los arrays intactos
+        return tuple(np.where(invalid, np.nan, v)[()] for v in outputs)
+
+    @st.cache_data(show_spinner=False)
+    def calculate_historical_orders(raw_df, budget_eur, copper_pct, transport_factor):
+        # Función pura (sin mutar raw_df) para que Streamlit pueda memoizar el
+        # resultado sobre el frame y los tres valores de los sliders
+        out = hist_orders(
+            raw_df["Copper"].to_numpy(dtype=np.float64, copy=False),
+            raw_df["Oil"].to_numpy(dtype=np.float64, copy=False),
+            raw_df["EUR/CNY"].to_numpy(dtype=np.float64, copy=False),
+            raw_df["USD/CNY"].to_numpy(dtype=np.float64, copy=False),
+            float(budget_eur), float(copper_pct), float(transport_factor)
+        )
+        historical_df = raw_df.copy()
+        historical_df[_ORDER_COLUMNS] = out
         return historical_df
 
-    def project_future_price(historical_data, span=30):
-        if historical_data.empty:
-            st.warning("Datos históricos vacíos para proyección.")
-            return np.nan, np.nan, np.nan
-        try:
-            close_data = historical_data["Close"].dropna()
-            if len(close_data) < 2:
-                st.warning(f"Datos insuficientes para proyección: solo {len(close_data)} filas disponibles.")
-                return np.nan, np.nan, np.nan
-            tail_len = min(span, len(close_data))
-            ema_series = close_data.ewm(span=tail_len, adjust=False).mean().dropna()
-            if ema_series.empty:
-                return np.nan, np.nan, np.nan
-            ema_value = float(ema_series.iloc[-1])
-            std_value = float(close_data.tail(tail_len).std())
-            if np.isnan(ema_value):
-                st.warning(f"Valor NaN detectado en EMA para período de {span} días.")
-                return np.nan, np.nan, np.nan
-            return ema_value, ema_value - std_value, ema_value + std_value
-        except Exception as e:
-            st.error(f"Error en project_future_price: {e}")
-            return np.nan, np.nan, np.nan
+    # Los cierres históricos solo cambian una vez al día: memoizar las EMAs y la
+    # pendiente sobre los bytes del array evita repetir las pasadas en cada rerun
+    @st.cache_data(ttl=3600, show_spinner=False, hash_funcs={np.ndarray: lambda a: a.tobytes()})
+    def _proj_stats_cached(mat, span):
+        emas, stds = ema_tail_std_batch(mat, span)
+        dx, ssx = _trend_grid(mat.shape[1])
+        slopes = ((mat - mat.mean(axis=1, keepdims=True)) * dx).sum(axis=1) / ssx
+        return emas, stds, slopes
+
+    @st.cache_data(ttl=3600, show_spinner=False, hash_funcs={np.ndarray: lambda a: a.tobytes()})
+    def _slope_cached(last_period):
+        dx, ssx = _trend_grid(last_period.size)
+        return float((dx * (last_period - last_period.mean())).sum() / ssx)
 
     def calculate_rsi(historical_data, period=14):
         if historical_data.empty or len(historical_data) < period + 1:
             return np.nan
-        close = historical_data["Close"]
-        delta = close.diff()
-        gain = delta.clip(lower=0)
-        loss = -delta.clip(upper=0)
-        avg_gain = gain.ewm(alpha=1/period, min_periods=period).mean()
-        avg_loss = loss.ewm(alpha=1/period, min_periods=period).mean()
-        rs = avg_gain / avg_loss
-        rsi = 100 - (100 / (1 + rs))
-        return float(rsi.iloc[-1])
+        close = historical_data["Close"].to_numpy(dtype=np.float64, copy=False).ravel()
+        return rsi_loop(close, period)
+
+    def calculate_rsi_multi(historical_data, periods):
+        if historical_data.empty or len(historical_data) < max(periods) + 1:
+            # Sin datos para el período más largo, cae al cálculo individual con su guarda
+            return [calculate_rsi(historical_data, p) for p in periods]
+        close = historical_data["Close"].to_numpy(dtype=np.float64, copy=False).ravel()
+        return rsi_multi(close, np.asarray(periods, dtype=np.int64))
 
     def calculate_trend(historical_data, period=30):
         if historical_data.empty or len(historical_data) < period:
             return np.nan, "Indeterminada"
-        last_period = historical_data["Close"].tail(period).values.flatten()
-        x = np.arange(len(last_period))
-        slope, _, _, _, _ = linregress(x, last_period)
+        last_period = historical_data["Close"].tail(period).to_numpy(dtype=np.float64, copy=False).ravel()
+        # Pendiente por mínimos cuadrados en forma cerrada: solo necesitamos
+        # la pendiente, no el resto de estadísticos de una regresión completa
+        slope = _slope_cached(last_period)
         return slope, "Alcista" if slope > 0 else "Bajista"
 
-    def create_historical_plot_copper_eurcny(historical_df):
+    @st.cache_data(ttl=600, show_spinner=False)
+    def _build_recommendations(copper_quantity_ton, max_copper_quantity_ton, min_copper_quantity_ton,
+                               avg_copper_quantity_ton, std_copper_quantity, copper_trend_30, copper_slope_30,
+                               oil_trend_30, oil_slope_30, eur_cny_price, copper_vol, rsi_copper, corr_copper_oil):
+        # Función pura sobre escalares: con estado idéntico el rerun recupera la
+        # lista memoizada y se ahorra todo el formateo de textos
+        recommendations = []
+        z_score = (copper_quantity_ton - avg_copper_quantity_ton) / std_copper_quantity if std_copper_quantity != 0 else 0
+        savings_vs_avg_ton = copper_quantity_ton - avg_copper_quantity_ton
+        pct_vs_avg = (savings_vs_avg_ton / avg_copper_quantity_ton * 100) if avg_copper_quantity_ton != 0 else 0
+        savings_vs_min_ton = copper_quantity_ton - min_copper_quantity_ton
+        pct_vs_min = (savings_vs_min_ton / min_copper_quantity_ton * 100) if min_copper_quantity_ton != 0 else 0
+        savings_vs_max_ton = copper_quantity_ton - max_copper_quantity_ton
+        pct_vs_max = (savings_vs_max_ton / max_copper_quantity_ton * 100) if max_copper_quantity_ton != 0 else 0
+        # Cada métrica se comprueba contra NaN antes de formatear y se formatea
+        # una sola vez para la rama elegida: nada de textos que luego se descartan
+        if not pd.isna(savings_vs_avg_ton):
+            z_str = fmt2(z_score)
+            if savings_vs_avg_ton > 0:
+                recommendations.append(f"La cantidad actual de cobre comprable supera el promedio histórico en {fmt2(savings_vs_avg_ton)} toneladas, lo que representa un incremento del {fmt2(pct_vs_avg)}%. Con un Z-score de {z_str}, esto indica una desviación positiva significativa, sugiriendo una ventana óptima para adquisición.")
+            else:
+                recommendations.append(f"La cantidad actual de cobre comprable es inferior al promedio histórico en {fmt2(-savings_vs_avg_ton)} toneladas, equivalente a una reducción del {fmt2(-pct_vs_avg)}%. El Z-score de {z_str} resalta una desviación negativa, recomendando evaluación de factores macroeconómicos.")
+        if savings_vs_min_ton > 0:
+            recommendations.append(f"Comparado con el mínimo histórico, la cantidad actual muestra una mejora de {fmt2(savings_vs_min_ton)} toneladas ({fmt2(pct_vs_min)}%), ofreciendo un buffer robusto contra volatilidades.")
+        if savings_vs_max_ton < 0:
+            recommendations.append(f"La cantidad actual está {fmt2(-savings_vs_max_ton)} toneladas por debajo del máximo histórico ({fmt2(pct_vs_max)}%), lo que sugiere espacio para optimización si las tendencias alcistas persisten.")
+        if not pd.isna(copper_slope_30):
+            slope_str = fmt4(copper_slope_30)
+            if copper_trend_30 == "Bajista":
+                recommendations.append(f"La tendencia bajista del cobre en los últimos 30 días, con una pendiente de {slope_str}, sugiere postergar la compra 2-4 semanas para maximizar la cantidad comprable.")
+            else:
+                recommendations.append(f"La tendencia alcista del cobre, con pendiente de {slope_str}, aconseja una adquisición inmediata para mitigar riesgos de escalada de precios.")
+        if not pd.isna(oil_slope_30):
+            slope_str = fmt4(oil_slope_30)
+            if oil_trend_30 == "Bajista":
+                recommendations.append(f"La declinación en el precio del petróleo (pendiente: {slope_str}) podría reducir los costes de transporte del 2-5%, beneficiando operaciones logísticas.")
+            else:
+                recommendations.append(f"El ascenso en el precio del petróleo (pendiente: {slope_str}) urge a actuar para eludir incrementos en costes de flete.")
+        if eur_cny_price < 8.5:
+            recommendations.append(f"El tipo de cambio EUR/CNY por debajo de 8.5 erosiona el poder adquisitivo; monitorear políticas monetarias del BCE es clave.")
+        else:
+            recommendations.append(f"El tipo de cambio EUR/CNY ≥ 8.5 robustece el euro, maximizando la conversión a yuanes y negociaciones con contrapartes chinas.")
+        if not pd.isna(copper_vol):
+            vol_str = fmt2(copper_vol)
+            if copper_vol > 5:
+                recommendations.append(f"La volatilidad del cobre en {vol_str}% indica un mercado inestable. Se recomienda cobertura o compras fraccionadas.")
+            else:
+                recommendations.append(f"Con una volatilidad del cobre en {vol_str}%, el mercado es estable, favoreciendo compromisos a mediano plazo.")
+        if not pd.isna(rsi_copper):
+            rsi_str = fmt2(rsi_copper)
+            if rsi_copper > 70:
+                recommendations.append(f"El RSI del cobre en {rsi_str} indica sobrecompra, sugiriendo una posible corrección bajista.")
+            elif rsi_copper < 30:
+                recommendations.append(f"El RSI del cobre en {rsi_str} señala sobreventa, presentando una oportunidad de compra.")
+            else:
+                recommendations.append(f"El RSI del cobre en {rsi_str} refleja equilibrio de mercado.")
+        if not pd.isna(corr_copper_oil) and corr_copper_oil > 0.5:
+            recommendations.append(f"La correlación positiva cobre-petróleo ({fmt4(corr_copper_oil)}) sugiere monitorear indicadores energéticos.")
+        return recommendations
+
+    def _df_fingerprint(df):
+        # Huella barata del frame para la caché de figuras: longitud, última fecha
+        # y últimos valores sensibles a los sliders, sin hashear el frame completo
+        if df.empty:
+            return 0
+        return (len(df), str(df.index[-1]), float(df["Copper"].to_numpy()[-1]), float(df["Copper Quantity ton"].to_numpy()[-1]))
+
+    @st.cache_data(ttl=3600, show_spinner=False, hash_funcs={pd.DataFrame: _df_fingerprint})
+    def create_historical_plot_copper_eurcny(historical_df, stats):
         fig = go.Figure()
-        fig.add_trace(go.Scatter(x=historical_df.index, y=historical_df["Copper"], mode="lines", name="Cobre ($/lb)"))
-        fig.add_trace(go.Scatter(x=historical_df.index, y=historical_df["EUR/CNY"], mode="lines", name="EUR/CNY"))
-        fig.add_hline(y=historical_df["Copper"].mean(), line_dash="dash", line_color="gray", annotation_text="Promedio Cobre")
-        fig.add_hline(y=historical_df["EUR/CNY"].mean(), line_dash="dash", line_color="gray", annotation_text="Promedio EUR/CNY", annotation_position="top left")
-        fig.add_hline(y=historical_df["Copper"].max(), line_dash="dot", line_color="red", annotation_text="Máximo Cobre")
-        fig.add_hline(y=historical_df["Copper"].min(), line_dash="dot", line_color="green", annotation_text="Mínimo Cobre")
+        fig.add_trace(go.Scattergl(x=historical_df.index, y=historical_df["Copper"], mode="lines", name="Cobre ($/lb)"))
+        fig.add_trace(go.Scattergl(x=historical_df.index, y=historical_df["EUR/CNY"], mode="lines", name="EUR/CNY"))
+        fig.add_hline(y=stats["Copper"]["mean"], line_dash="dash", line_color="gray", annotation_text="Promedio Cobre")
+        fig.add_hline(y=stats["EUR/CNY"]["mean"], line_dash="dash", line_color="gray", annotation_text="Promedio EUR/CNY", annotation_position="top left")
+        fig.add_hline(y=stats["Copper"]["max"], line_dash="dot", line_color="red", annotation_text="Máximo Cobre")
+        fig.add_hline(y=stats["Copper"]["min"], line_dash="dot", line_color="green", annotation_text="Mínimo Cobre")
         fig.update_layout(
             title="Evolución Cobre y EUR/CNY (9 Meses)",
             xaxis_title="Fecha",
@@ -248,12 +384,13 @@ with tab1:
         )
         return fig
 
-    def create_historical_plot_oil(historical_df):
+    @st.cache_data(ttl=3600, show_spinner=False, hash_funcs={pd.DataFrame: _df_fingerprint})
+    def create_historical_plot_oil(historical_df, stats):
         fig = go.Figure()
-        fig.add_trace(go.Scatter(x=historical_df.index, y=historical_df["Oil"], mode="lines", name="Petróleo ($/barril)"))
-        fig.add_hline(y=historical_df["Oil"].mean(), line_dash="dash", line_color="gray", annotation_text="Promedio Petróleo")
-        fig.add_hline(y=historical_df["Oil"].max(), line_dash="dot", line_color="red", annotation_text="Máximo Petróleo")
-        fig.add_hline(y=historical_df["Oil"].min(), line_dash="dot", line_color="green", annotation_text="Mínimo Petróleo")
+        fig.add_trace(go.Scattergl(x=historical_df.index, y=historical_df["Oil"], mode="lines", name="Petróleo ($/barril)"))
+        fig.add_hline(y=stats["Oil"]["mean"], line_dash="dash", line_color="gray", annotation_text="Promedio Petróleo")
+        fig.add_hline(y=stats["Oil"]["max"], line_dash="dot", line_color="red", annotation_text="Máximo Petróleo")
+        fig.add_hline(y=stats["Oil"]["min"], line_dash="dot", line_color="green", annotation_text="Mínimo Petróleo")
         fig.update_layout(
             title="Evolución Petróleo (9 Meses)",
             xaxis_title="Fecha",
@@ -264,12 +401,13 @@ with tab1:
         )
         return fig
 
-    def create_historical_plot_copper_quantity(historical_df):
+    @st.cache_data(ttl=3600, show_spinner=False, hash_funcs={pd.DataFrame: _df_fingerprint})
+    def create_historical_plot_copper_quantity(historical_df, stats):
         fig = go.Figure()
-        fig.add_trace(go.Scatter(x=historical_df.index, y=historical_df["Copper Quantity ton"], mode="lines", name="Cantidad Cobre (toneladas)"))
-        fig.add_hline(y=historical_df["Copper Quantity ton"].mean(), line_dash="dash", line_color="gray", annotation_text="Promedio Cantidad")
-        fig.add_hline(y=historical_df["Copper Quantity ton"].max(), line_dash="dot", line_color="red", annotation_text="Máximo Cantidad")
-        fig.add_hline(y=historical_df["Copper Quantity ton"].min(), line_dash="dot", line_color="green", annotation_text="Mínimo Cantidad")
+        fig.add_trace(go.Scattergl(x=historical_df.index, y=historical_df["Copper Quantity ton"], mode="lines", name="Cantidad Cobre (toneladas)"))
+        fig.add_hline(y=stats["Copper Quantity ton"]["mean"], line_dash="dash", line_color="gray", annotation_text="Promedio Cantidad")
+        fig.add_hline(y=stats["Copper Quantity ton"]["max"], line_dash="dot", line_color="red", annotation_text="Máximo Cantidad")
+        fig.add_hline(y=stats["Copper Quantity ton"]["min"], line_dash="dot", line_color="green", annotation_text="Mínimo Cantidad")
         fig.update_layout(
             title="Cantidad de Cobre Comprable (9 Meses)",
             xaxis_title="Fecha",
@@ -282,8 +420,8 @@ with tab1:
 
     def create_realtime_plot(realtime_df):
         fig = go.Figure()
-        fig.add_trace(go.Scatter(x=realtime_df["timestamps"], y=realtime_df["copper"], mode="lines+markers", name="Cobre ($/lb)", line=dict(width=2)))
-        fig.add_trace(go.Scatter(x=realtime_df["timestamps"], y=realtime_df["eur_cny"], mode="lines+markers", name="EUR/CNY", line=dict(width=2)))
+        fig.add_trace(go.Scattergl(x=realtime_df["timestamps"], y=realtime_df["copper"], mode="lines+markers", name="Cobre ($/lb)", line=dict(width=2)))
+        fig.add_trace(go.Scattergl(x=realtime_df["timestamps"], y=realtime_df["eur_cny"], mode="lines+markers", name="EUR/CNY", line=dict(width=2)))
         fig.update_layout(
             title="Tiempo Real Cobre y EUR/CNY",
             xaxis_title="Tiempo",
@@ -296,7 +434,7 @@ with tab1:
 
     def create_realtime_plot_oil(realtime_df):
         fig = go.Figure()
-        fig.add_trace(go.Scatter(x=realtime_df["timestamps"], y=realtime_df["oil"], mode="lines+markers", name="Petróleo ($/barril)", line=dict(width=2)))
+        fig.add_trace(go.Scattergl(x=realtime_df["timestamps"], y=realtime_df["oil"], mode="lines+markers", name="Petróleo ($/barril)", line=dict(width=2)))
         fig.update_layout(
             title="Tiempo Real Petróleo",
             xaxis_title="Tiempo",
@@ -307,35 +445,102 @@ with tab1:
         )
         return fig
 
-    # Datos históricos
-    copper_hist, oil_hist, eur_cny_hist, usd_cny_hist = fetch_historical_data()
+    # Esqueletos de figuras construidos una sola vez por proceso (layout y trazas
+    # con los datos vacíos); cada refresco solo muta x/y de las trazas en lugar de
+    # reconstruir y re-serializar el objeto Figure completo
+    @st.cache_resource(show_spinner=False)
+    def _proj_fig_skeleton():
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(
+            x=["Actual", "Esperado", "Mínimo", "Máximo"],
+            y=[None] * 4,
+            mode="lines+markers",
+            name="Cantidad Proyectada",
+            line=dict(width=2)
+        ))
+        fig.add_trace(go.Scatter(
+            x=["Mínimo", "Máximo", "Máximo", "Mínimo"],
+            y=[None] * 4,
+            fill="toself",
+            fillcolor="rgba(0,100,80,0.2)",
+            line=dict(color="rgba(255,255,255,0)"),
+            name="Intervalo de Confianza",
+            showlegend=True
+        ))
+        fig.update_layout(
+            title="Proyección de Cantidad de Cobre Comprable a 4 Meses",
+            xaxis_title="Escenario",
+            yaxis_title="Toneladas de Cobre",
+            hovermode="x unified",
+            showlegend=True
+        )
+        return fig
+
+    @st.cache_resource(show_spinner=False)
+    def _sens_fig_skeleton():
+        fig = go.Figure(go.Bar(x=[], y=[], marker_color="teal"))
+        fig.update_layout(
+            title="Impacto de ±5% en Variables Clave",
+            xaxis_title="Escenario",
+            yaxis_title="Toneladas de Cobre",
+            hovermode="x unified"
+        )
+        return fig
+
+    @st.cache_resource(show_spinner=False)
+    def _bb_macd_fig_skeleton():
+        # Bollinger y MACD comparten figura (dos filas con eje X común): un
+        # único payload Plotly→navegador por refresco en vez de dos gráficos
+        fig = make_subplots(
+            rows=2, cols=1, shared_xaxes=True,
+            subplot_titles=("Bandas de Bollinger para el Cobre", "MACD para el Cobre")
+        )
+        fig.add_trace(go.Scatter(x=[], y=[], name='Precio Cobre', line=dict(color='royalblue')), row=1, col=1)
+        fig.add_trace(go.Scatter(x=[], y=[], name='Banda Superior', line=dict(color='red', dash='dash')), row=1, col=1)
+        fig.add_trace(go.Scatter(x=[], y=[], name='Media Móvil (20)', line=dict(color='green')), row=1, col=1)
+        fig.add_trace(go.Scatter(x=[], y=[], name='Banda Inferior', line=dict(color='red', dash='dash')), row=1, col=1)
+        fig.add_trace(go.Scatter(x=[], y=[], name='MACD', line=dict(color='blue')), row=2, col=1)
+        fig.add_trace(go.Scatter(x=[], y=[], name='Línea de Señal', line=dict(color='orange')), row=2, col=1)
+        fig.add_trace(go.Bar(x=[], y=[], name='Histograma', marker_color='gray'), row=2, col=1)
+        fig.update_layout(hovermode="x unified", showlegend=True)
+        fig.update_yaxes(title_text="Precio (USD/lb)", row=1, col=1)
+        fig.update_yaxes(title_text="Valor", row=2, col=1)
+        fig.update_xaxes(title_text="Fecha", row=2, col=1)
+        return fig
+
+    # Datos históricos (descargados una sola vez antes de las pestañas)
     if not copper_hist.empty and not oil_hist.empty and not eur_cny_hist.empty and not usd_cny_hist.empty:
-        common_index = copper_hist.index.intersection(oil_hist.index).intersection(eur_cny_hist.index).intersection(usd_cny_hist.index)
-        historical_df = pd.DataFrame({
-            "Date": common_index,
-            "Copper": copper_hist.loc[common_index, "Close"].values.flatten(),
-            "Oil": oil_hist.loc[common_index, "Close"].values.flatten(),
-            "EUR/CNY": eur_cny_hist.loc[common_index, "Close"].values.flatten(),
-            "USD/CNY": usd_cny_hist.loc[common_index, "Close"].values.flatten()
-        }).dropna()
-        historical_df.set_index("Date", inplace=True)
+        # join="inner" hace la intersección de índices en una sola operación nativa
+        historical_df = pd.concat(
+            [copper_hist["Close"], oil_hist["Close"], eur_cny_hist["Close"], usd_cny_hist["Close"]],
+            axis=1, join="inner", keys=["Copper", "Oil", "EUR/CNY", "USD/CNY"]
+        ).dropna()
+        historical_df.columns = ["Copper", "Oil", "EUR/CNY", "USD/CNY"]
+        historical_df.index.name = "Date"
         historical_df = calculate_historical_orders(historical_df, budget_eur, copper_percentage, transport_cost_factor)
     else:
         historical_df = pd.DataFrame()
         st.warning("No se pudieron obtener datos históricos.")
 
+    # Reducciones (media/máximo/mínimo/std) calculadas una sola vez por columna
+    # y reutilizadas en los gráficos y en las recomendaciones
+    if not historical_df.empty:
+        hist_stats = {c: historical_df[c].agg(["mean", "max", "min", "std"]) for c in ("Copper", "Oil", "EUR/CNY", "Copper Quantity ton")}
+    else:
+        hist_stats = {}
+
     # Gráficos históricos
     st.subheader("Evolución Últimos 9 Meses")
     if not historical_df.empty:
         col_hist1, col_hist2 = st.columns(2)
         with col_hist1:
-            fig_hist_copper = create_historical_plot_copper_eurcny(historical_df)
+            fig_hist_copper = create_historical_plot_copper_eurcny(historical_df, hist_stats)
             st.plotly_chart(fig_hist_copper, use_container_width=True)
         with col_hist2:
-            fig_hist_oil = create_historical_plot_oil(historical_df)
+            fig_hist_oil = create_historical_plot_oil(historical_df, hist_stats)
             st.plotly_chart(fig_hist_oil, use_container_width=True)
         st.subheader("Cantidad de Cobre Comprable")
-        fig_copper_quantity = create_historical_plot_copper_quantity(historical_df)
+        fig_copper_quantity = create_historical_plot_copper_quantity(historical_df, hist_stats)
         st.plotly_chart(fig_copper_quantity, use_container_width=True)
     else:
         st.info("Sin datos históricos.")
@@ -346,24 +551,39 @@ with tab1:
     # Placeholder for dynamic content
     placeholder = st.empty()
 
+    @dataclass
+    class _HistCtx:
+        # Vista numpy de los cierres del cobre y banderas validadas una sola
+        # vez por refresco: el resto del panel consulta las banderas en lugar
+        # de re-sondear .empty/columns/len de pandas en cada bloque
+        copper_close: np.ndarray
+        has_hist: bool
+        has_bb: bool
+        has_macd: bool
+
     def update_dashboard():
+        if not copper_hist.empty and 'Close' in copper_hist.columns:
+            _close = copper_hist['Close'].to_numpy(dtype=np.float64, copy=False).ravel()
+        else:
+            _close = np.empty(0)
+        ctx = _HistCtx(_close, not historical_df.empty, _close.size >= 20, _close.size >= 26)
         with placeholder.container():
             copper_price, oil_price, eur_cny_price, usd_cny_price, timestamp = fetch_realtime_data()
             budget_cny, copper_budget_cny, other_budget_cny, copper_quantity_lb, copper_quantity_ton, transport_cost_cny, other_cost_cny, total_order_cost_cny, budget_status = calculate_order(
                 budget_eur, copper_percentage, transport_cost_factor, copper_price, oil_price, eur_cny_price, usd_cny_price
             )
             append_realtime_data(copper_price, oil_price, eur_cny_price, usd_cny_price, copper_quantity_ton, timestamp)
-            realtime_df = pd.DataFrame(st.session_state.data)
+            realtime_df = pd.DataFrame({k: list(v) for k, v in st.session_state.data.items()})
             # KPIs
             col1, col2, col3, col4 = st.columns(4)
             with col1:
-                st.metric("Cobre ($/lb)", locale.format_string('%.2f', copper_price, grouping=True) if not np.isnan(copper_price) else "N/A")
+                st.metric("Cobre ($/lb)", fmt2(copper_price) if not np.isnan(copper_price) else "N/A")
             with col2:
-                st.metric("Petróleo ($/barril)", locale.format_string('%.2f', oil_price, grouping=True) if not np.isnan(oil_price) else "N/A")
+                st.metric("Petróleo ($/barril)", fmt2(oil_price) if not np.isnan(oil_price) else "N/A")
             with col3:
-                st.metric("EUR/CNY", locale.format_string('%.4f', eur_cny_price, grouping=True) if not np.isnan(eur_cny_price) else "N/A")
+                st.metric("EUR/CNY", fmt4(eur_cny_price) if not np.isnan(eur_cny_price) else "N/A")
             with col4:
-                st.metric("USD/CNY", locale.format_string('%.4f', usd_cny_price, grouping=True) if not np.isnan(usd_cny_price) else "N/A")
+                st.metric("USD/CNY", fmt4(usd_cny_price) if not np.isnan(usd_cny_price) else "N/A")
             # Gráficos en tiempo real
             st.subheader("Datos en Tiempo Real")
             col_rt1, col_rt2 = st.columns(2)
@@ -376,23 +596,28 @@ with tab1:
                     fig_rt_oil = create_realtime_plot_oil(realtime_df)
                     st.plotly_chart(fig_rt_oil, use_container_width=True)
             # Cálculo del pedido
-            st.subheader(f"Cálculo del Pedido con Presupuesto de {locale.format_string('%.2f', budget_eur, grouping=True)} EUR")
+            st.subheader(f"Cálculo del Pedido con Presupuesto de {fmt2(budget_eur)} EUR")
             if not np.isnan(budget_cny):
-                st.write(f"Presupuesto en CNY: {locale.format_string('%.2f', budget_cny, grouping=True)} CNY")
-                st.write(f"- Coste del cobre ({copper_percentage}%): {locale.format_string('%.2f', copper_budget_cny, grouping=True)} CNY")
-                st.write(f" - Cantidad de cobre: {locale.format_string('%.2f', copper_quantity_ton, grouping=True)} toneladas (~{locale.format_string('%.2f', copper_quantity_lb, grouping=True)} lb)")
-                st.write(f"- Costes de transporte ({transport_cost_factor}% del precio del petróleo): {locale.format_string('%.2f', transport_cost_cny, grouping=True)} CNY")
-                st.write(f"- Otros costes: {locale.format_string('%.2f', other_cost_cny, grouping=True)} CNY")
-                st.write(f"**Coste total del pedido**: {locale.format_string('%.2f', total_order_cost_cny, grouping=True)} CNY")
+                st.write(f"Presupuesto en CNY: {fmt2(budget_cny)} CNY")
+                st.write(f"- Coste del cobre ({copper_percentage}%): {fmt2(copper_budget_cny)} CNY")
+                st.write(f" - Cantidad de cobre: {fmt2(copper_quantity_ton)} toneladas (~{fmt2(copper_quantity_lb)} lb)")
+                st.write(f"- Costes de transporte ({transport_cost_factor}% del precio del petróleo): {fmt2(transport_cost_cny)} CNY")
+                st.write(f"- Otros costes: {fmt2(other_cost_cny)} CNY")
+                st.write(f"**Coste total del pedido**: {fmt2(total_order_cost_cny)} CNY")
                 if budget_status >= 0:
-                    st.write(f"**Sobrante**: {locale.format_string('%.2f', budget_status, grouping=True)} CNY")
+                    st.write(f"**Sobrante**: {fmt2(budget_status)} CNY")
                 else:
-                    st.warning(f"**Déficit**: {locale.format_string('%.2f', -budget_status, grouping=True)} CNY")
+                    st.warning(f"**Déficit**: {fmt2(-budget_status)} CNY")
             else:
                 st.warning("No se pudo calcular el pedido debido a datos faltantes.")
             # Análisis para comprar
             st.subheader("Mejor Momento para Comprar")
-            if not historical_df.empty:
+            if ctx.has_hist:
+                # Vistas NumPy y desviaciones típicas reutilizadas varias veces más
+                # abajo (volatilidad, intervalos de proyección), calculadas una vez
+                hist_np = {k: historical_df[k].to_numpy(dtype=np.float64, copy=False) for k in ("Copper", "Oil", "EUR/CNY", "USD/CNY")}
+                hist_std = {k: float(np.std(v, ddof=1)) for k, v in hist_np.items()}
+                copper_tail30 = hist_np["Copper"][-30:]
                 copper_slope_30, copper_trend_30 = calculate_trend(copper_hist, 30)
                 oil_slope_30, oil_trend_30 = calculate_trend(oil_hist, 30)
                 eur_cny_slope_30, eur_cny_trend_30 = calculate_trend(eur_cny_hist, 30)
@@ -402,19 +627,19 @@ with tab1:
                     "Indicador": ["Tendencia Cobre", "Tendencia Petróleo", "Tendencia EUR/CNY", "Tendencia USD/CNY"],
                     "Período": ["30 días", "30 días", "30 días", "30 días"],
                     "Tendencia": [copper_trend_30, oil_trend_30, eur_cny_trend_30, usd_cny_trend_30],
-                    "Pendiente": [locale.format_string('%.4f', copper_slope_30, grouping=True),
-                                  locale.format_string('%.4f', oil_slope_30, grouping=True),
-                                  locale.format_string('%.4f', eur_cny_slope_30, grouping=True),
-                                  locale.format_string('%.4f', usd_cny_slope_30, grouping=True)]
+                    "Pendiente": [fmt4(copper_slope_30),
+                                  fmt4(oil_slope_30),
+                                  fmt4(eur_cny_slope_30),
+                                  fmt4(usd_cny_slope_30)]
                 })
                 st.table(trends_df)
                 # Indicadores técnicos adicionales
-                rsi_copper = calculate_rsi(copper_hist)
-                rsi_copper_30 = calculate_rsi(copper_hist, period=30)
-                rsi_copper_50 = calculate_rsi(copper_hist, period=50)
+                rsi_copper, rsi_copper_30, rsi_copper_50 = calculate_rsi_multi(copper_hist, (14, 30, 50))
                 rsi_oil = calculate_rsi(oil_hist)
-                corr_copper_oil = historical_df['Copper'].corr(historical_df['Oil']) if not historical_df.empty else np.nan
-                corr_copper_eurcny = historical_df['Copper'].corr(historical_df['EUR/CNY']) if not historical_df.empty else np.nan
+                # Todas las correlaciones por pares en una sola llamada BLAS
+                corr_matrix = np.corrcoef(historical_df[["Copper", "Oil", "EUR/CNY"]].to_numpy(dtype=np.float64, copy=False), rowvar=False)
+                corr_copper_oil = corr_matrix[0, 1]
+                corr_copper_eurcny = corr_matrix[0, 2]
                 st.write("**Indicadores Técnicos Adicionales:**")
                 tech_df = pd.DataFrame({
                     "Indicador": [
@@ -426,107 +651,50 @@ with tab1:
                         "Correlación Cobre-EUR/CNY"
                     ],
                     "Valor": [
-                        locale.format_string('%.2f', rsi_copper, grouping=True) if not pd.isna(rsi_copper) else "N/A",
-                        locale.format_string('%.2f', rsi_copper_30, grouping=True) if not pd.isna(rsi_copper_30) else "N/A",
-                        locale.format_string('%.2f', rsi_copper_50, grouping=True) if not pd.isna(rsi_copper_50) else "N/A",
-                        locale.format_string('%.2f', rsi_oil, grouping=True) if not pd.isna(rsi_oil) else "N/A",
-                        locale.format_string('%.4f', corr_copper_oil, grouping=True) if not pd.isna(corr_copper_oil) else "N/A",
-                        locale.format_string('%.4f', corr_copper_eurcny, grouping=True) if not pd.isna(corr_copper_eurcny) else "N/A"
+                        fmt2(rsi_copper) if not pd.isna(rsi_copper) else "N/A",
+                        fmt2(rsi_copper_30) if not pd.isna(rsi_copper_30) else "N/A",
+                        fmt2(rsi_copper_50) if not pd.isna(rsi_copper_50) else "N/A",
+                        fmt2(rsi_oil) if not pd.isna(rsi_oil) else "N/A",
+                        fmt4(corr_copper_oil) if not pd.isna(corr_copper_oil) else "N/A",
+                        fmt4(corr_copper_eurcny) if not pd.isna(corr_copper_eurcny) else "N/A"
                     ]
                 })
                 st.table(tech_df)
                 # Recomendaciones
                 st.write("**Recomendaciones Analíticas:**")
-                recommendations = []
-                max_copper_quantity_ton = historical_df["Copper Quantity ton"].max()
-                min_copper_quantity_ton = historical_df["Copper Quantity ton"].min()
-                avg_copper_quantity_ton = historical_df["Copper Quantity ton"].mean()
-                std_copper_quantity = historical_df["Copper Quantity ton"].std()
-                z_score = (copper_quantity_ton - avg_copper_quantity_ton) / std_copper_quantity if std_copper_quantity != 0 else 0
-                savings_vs_avg_ton = copper_quantity_ton - avg_copper_quantity_ton
-                pct_vs_avg = (savings_vs_avg_ton / avg_copper_quantity_ton * 100) if avg_copper_quantity_ton != 0 else 0
-                savings_vs_min_ton = copper_quantity_ton - min_copper_quantity_ton
-                pct_vs_min = (savings_vs_min_ton / min_copper_quantity_ton * 100) if min_copper_quantity_ton != 0 else 0
-                savings_vs_max_ton = copper_quantity_ton - max_copper_quantity_ton
-                pct_vs_max = (savings_vs_max_ton / max_copper_quantity_ton * 100) if max_copper_quantity_ton != 0 else 0
-                if savings_vs_avg_ton > 0:
-                    recommendations.append(f"La cantidad actual de cobre comprable supera el promedio histórico en {locale.format_string('%.2f', savings_vs_avg_ton, grouping=True)} toneladas, lo que representa un incremento del {locale.format_string('%.2f', pct_vs_avg, grouping=True)}%. Con un Z-score de {locale.format_string('%.2f', z_score, grouping=True)}, esto indica una desviación positiva significativa, sugiriendo una ventana óptima para adquisición.")
-                else:
-                    recommendations.append(f"La cantidad actual de cobre comprable es inferior al promedio histórico en {locale.format_string('%.2f', -savings_vs_avg_ton, grouping=True)} toneladas, equivalente a una reducción del {locale.format_string('%.2f', -pct_vs_avg, grouping=True)}%. El Z-score de {locale.format_string('%.2f', z_score, grouping=True)} resalta una desviación negativa, recomendando evaluación de factores macroeconómicos.")
-                if savings_vs_min_ton > 0:
-                    recommendations.append(f"Comparado con el mínimo histórico, la cantidad actual muestra una mejora de {locale.format_string('%.2f', savings_vs_min_ton, grouping=True)} toneladas ({locale.format_string('%.2f', pct_vs_min, grouping=True)}%), ofreciendo un buffer robusto contra volatilidades.")
-                if savings_vs_max_ton < 0:
-                    recommendations.append(f"La cantidad actual está {locale.format_string('%.2f', -savings_vs_max_ton, grouping=True)} toneladas por debajo del máximo histórico ({locale.format_string('%.2f', pct_vs_max, grouping=True)}%), lo que sugiere espacio para optimización si las tendencias alcistas persisten.")
-                if copper_trend_30 == "Bajista":
-                    recommendations.append(f"La tendencia bajista del cobre en los últimos 30 días, con una pendiente de {locale.format_string('%.4f', copper_slope_30, grouping=True)}, sugiere postergar la compra 2-4 semanas para maximizar la cantidad comprable.")
-                else:
-                    recommendations.append(f"La tendencia alcista del cobre, con pendiente de {locale.format_string('%.4f', copper_slope_30, grouping=True)}, aconseja una adquisición inmediata para mitigar riesgos de escalada de precios.")
-                if oil_trend_30 == "Bajista":
-                    recommendations.append(f"La declinación en el precio del petróleo (pendiente: {locale.format_string('%.4f', oil_slope_30, grouping=True)}) podría reducir los costes de transporte del 2-5%, beneficiando operaciones logísticas.")
-                else:
-                    recommendations.append(f"El ascenso en el precio del petróleo (pendiente: {locale.format_string('%.4f', oil_slope_30, grouping=True)}) urge a actuar para eludir incrementos en costes de flete.")
-                if eur_cny_price < 8.5:
-                    recommendations.append(f"El tipo de cambio EUR/CNY por debajo de 8.5 erosiona el poder adquisitivo; monitorear políticas monetarias del BCE es clave.")
-                else:
-                    recommendations.append(f"El tipo de cambio EUR/CNY ≥ 8.5 robustece el euro, maximizando la conversión a yuanes y negociaciones con contrapartes chinas.")
-                copper_vol = historical_df["Copper"].tail(30).std() / historical_df["Copper"].tail(30).mean() * 100 if not historical_df.empty else 0
-                if copper_vol > 5:
-                    recommendations.append(f"La volatilidad del cobre en {locale.format_string('%.2f', copper_vol, grouping=True)}% indica un mercado inestable. Se recomienda cobertura o compras fraccionadas.")
-                else:
-                    recommendations.append(f"Con una volatilidad del cobre en {locale.format_string('%.2f', copper_vol, grouping=True)}%, el mercado es estable, favoreciendo compromisos a mediano plazo.")
-                if not pd.isna(rsi_copper):
-                    if rsi_copper > 70:
-                        recommendations.append(f"El RSI del cobre en {locale.format_string('%.2f', rsi_copper, grouping=True)} indica sobrecompra, sugiriendo una posible corrección bajista.")
-                    elif rsi_copper < 30:
-                        recommendations.append(f"El RSI del cobre en {locale.format_string('%.2f', rsi_copper, grouping=True)} señala sobreventa, presentando una oportunidad de compra.")
-                    else:
-                        recommendations.append(f"El RSI del cobre en {locale.format_string('%.2f', rsi_copper, grouping=True)} refleja equilibrio de mercado.")
-                if not pd.isna(corr_copper_oil) and corr_copper_oil > 0.5:
-                    recommendations.append(f"La correlación positiva cobre-petróleo ({locale.format_string('%.4f', corr_copper_oil, grouping=True)}) sugiere monitorear indicadores energéticos.")
+                qty_stats = hist_stats["Copper Quantity ton"]
+                copper_vol = float(np.std(copper_tail30, ddof=1) / copper_tail30.mean() * 100)
+                recommendations = _build_recommendations(
+                    copper_quantity_ton, qty_stats["max"], qty_stats["min"], qty_stats["mean"], qty_stats["std"],
+                    copper_trend_30, copper_slope_30, oil_trend_30, oil_slope_30,
+                    eur_cny_price, copper_vol, rsi_copper, corr_copper_oil
+                )
                 for rec in recommendations:
                     st.write(rec)
 
                 # Proyección a 4 Meses mejorada
                 st.subheader("Proyección a 4 Meses (Toneladas de Cobre Comprable)")
-                if not historical_df.empty:
+                if ctx.has_hist:
                     span = 30
-                    days_ahead = 80  # Días hábiles en 4 meses
-                    # Proyección para cobre
-                    copper_ema, copper_min, copper_max = project_future_price(copper_hist, span)
-                    if not np.isnan(copper_ema):
-                        copper_slope_30, _ = calculate_trend(copper_hist, span)
-                        copper_future = copper_ema + (copper_slope_30 * days_ahead)
-                        copper_future_min = copper_min + (copper_slope_30 * days_ahead) - (historical_df["Copper"].std() * np.sqrt(days_ahead) / np.sqrt(252))
-                        copper_future_max = copper_max + (copper_slope_30 * days_ahead) + (historical_df["Copper"].std() * np.sqrt(days_ahead) / np.sqrt(252))
-                    else:
-                        copper_future, copper_future_min, copper_future_max = copper_price, copper_price, copper_price
-                    # Proyección para petróleo
-                    oil_ema, oil_min, oil_max = project_future_price(oil_hist, span)
-                    if not np.isnan(oil_ema):
-                        oil_slope_30, _ = calculate_trend(oil_hist, span)
-                        oil_future = oil_ema + (oil_slope_30 * days_ahead)
-                        oil_future_min = oil_min + (oil_slope_30 * days_ahead) - (historical_df["Oil"].std() * np.sqrt(days_ahead) / np.sqrt(252))
-                        oil_future_max = oil_max + (oil_slope_30 * days_ahead) + (historical_df["Oil"].std() * np.sqrt(days_ahead) / np.sqrt(252))
-                    else:
-                        oil_future, oil_future_min, oil_future_max = oil_price, oil_price, oil_price
-                    # Proyección para EUR/CNY
-                    eur_cny_ema, eur_cny_min, eur_cny_max = project_future_price(eur_cny_hist, span)
-                    if not np.isnan(eur_cny_ema):
-                        eur_cny_slope_30, _ = calculate_trend(eur_cny_hist, span)
-                        eur_cny_future = eur_cny_ema + (eur_cny_slope_30 * days_ahead)
-                        eur_cny_future_min = eur_cny_min + (eur_cny_slope_30 * days_ahead) - (historical_df["EUR/CNY"].std() * np.sqrt(days_ahead) / np.sqrt(252))
-                        eur_cny_future_max = eur_cny_max + (eur_cny_slope_30 * days_ahead) + (historical_df["EUR/CNY"].std() * np.sqrt(days_ahead) / np.sqrt(252))
-                    else:
-                        eur_cny_future, eur_cny_future_min, eur_cny_future_max = eur_cny_price, eur_cny_price, eur_cny_price
-                    # Proyección para USD/CNY
-                    usd_cny_ema, usd_cny_min, usd_cny_max = project_future_price(usd_cny_hist, span)
-                    if not np.isnan(usd_cny_ema):
-                        usd_cny_slope_30, _ = calculate_trend(usd_cny_hist, span)
-                        usd_cny_future = usd_cny_ema + (usd_cny_slope_30 * days_ahead)
-                        usd_cny_future_min = usd_cny_min + (usd_cny_slope_30 * days_ahead) - (historical_df["USD/CNY"].std() * np.sqrt(days_ahead) / np.sqrt(252))
-                        usd_cny_future_max = usd_cny_max + (usd_cny_slope_30 * days_ahead) + (historical_df["USD/CNY"].std() * np.sqrt(days_ahead) / np.sqrt(252))
-                    else:
-                        usd_cny_future, usd_cny_future_min, usd_cny_future_max = usd_cny_price, usd_cny_price, usd_cny_price
+                    # Las cuatro series alineadas apiladas en una matriz (4, span):
+                    # EMAs, pendientes e intervalos salen de pasadas vectorizadas en
+                    # lugar de cuatro bloques casi idénticos en secuencia
+                    proj_keys = ("Copper", "Oil", "EUR/CNY", "USD/CNY")
+                    mat = np.stack([hist_np[k] for k in proj_keys])[:, -span:]
+                    emas, tail_stds, slopes = _proj_stats_cached(mat, span)
+                    futures, futures_min, futures_max = _proj_ci(
+                        emas, tail_stds, slopes, np.array([hist_std[k] for k in proj_keys])
+                    )
+                    # Donde la EMA o la desviación salgan NaN (series demasiado
+                    # cortas) se mantiene el precio actual, como antes
+                    spot = np.array([copper_price, oil_price, eur_cny_price, usd_cny_price])
+                    bad = np.isnan(emas) | np.isnan(tail_stds)
+                    futures = np.where(bad, spot, futures)
+                    futures_min = np.where(bad, spot, futures_min)
+                    futures_max = np.where(bad, spot, futures_max)
+                    copper_future, oil_future, eur_cny_future, usd_cny_future = futures
+                    copper_future_min, oil_future_min, eur_cny_future_min, usd_cny_future_min = futures_min
+                    copper_future_max, oil_future_max, eur_cny_future_max, usd_cny_future_max = futures_max
                     # Cálculo de cantidades proyectadas
                     _, _, _, _, future_copper_quantity_ton, _, _, _, _ = calculate_order(
                         budget_eur, copper_percentage, transport_cost_factor, copper_future, oil_future, eur_cny_future, usd_cny_future
@@ -539,56 +707,38 @@ with tab1:
                     )
                     delta_copper = future_copper_quantity_ton - copper_quantity_ton if not np.isnan(copper_quantity_ton) else np.nan
                     proj_data = {
-                        "Esperado (ton)": locale.format_string('%.2f', future_copper_quantity_ton, grouping=True),
-                        "Min (ton)": locale.format_string('%.2f', min_copper_quantity_ton, grouping=True),
-                        "Max (ton)": locale.format_string('%.2f', max_copper_quantity_ton, grouping=True),
-                        "Delta vs Actual (ton)": locale.format_string('%.2f', delta_copper, grouping=True)
+                        "Esperado (ton)": fmt2(future_copper_quantity_ton),
+                        "Min (ton)": fmt2(min_copper_quantity_ton),
+                        "Max (ton)": fmt2(max_copper_quantity_ton),
+                        "Delta vs Actual (ton)": fmt2(delta_copper)
                     }
                     st.table(pd.DataFrame([proj_data]))
                     # Gráfico de proyección mejorado con área de confianza
-                    fig_proj = go.Figure()
-                    fig_proj.add_trace(go.Scatter(
-                        x=["Actual", "Esperado", "Mínimo", "Máximo"],
-                        y=[copper_quantity_ton, future_copper_quantity_ton, min_copper_quantity_ton, max_copper_quantity_ton],
-                        mode="lines+markers",
-                        name="Cantidad Proyectada",
-                        line=dict(width=2)
-                    ))
-                    fig_proj.add_trace(go.Scatter(
-                        x=["Mínimo", "Máximo", "Máximo", "Mínimo"],
-                        y=[min_copper_quantity_ton, max_copper_quantity_ton, max_copper_quantity_ton, min_copper_quantity_ton],
-                        fill="toself",
-                        fillcolor="rgba(0,100,80,0.2)",
-                        line=dict(color="rgba(255,255,255,0)"),
-                        name="Intervalo de Confianza",
-                        showlegend=True
-                    ))
-                    fig_proj.update_layout(
-                        title="Proyección de Cantidad de Cobre Comprable a 4 Meses",
-                        xaxis_title="Escenario",
-                        yaxis_title="Toneladas de Cobre",
-                        hovermode="x unified",
-                        showlegend=True
-                    )
+                    fig_proj = _proj_fig_skeleton()
+                    fig_proj.data[0].y = [copper_quantity_ton, future_copper_quantity_ton, min_copper_quantity_ton, max_copper_quantity_ton]
+                    fig_proj.data[1].y = [min_copper_quantity_ton, max_copper_quantity_ton, max_copper_quantity_ton, min_copper_quantity_ton]
                     st.plotly_chart(fig_proj, use_container_width=True)
                 else:
                     st.info("No hay datos históricos suficientes para la proyección.")
 
                 # Indicadores Técnicos: Bollinger Bands y MACD
                 st.subheader("🔍 Indicadores Técnicos: Bollinger Bands y MACD para el Cobre")
-                if not copper_hist.empty and 'Close' in copper_hist.columns and len(copper_hist) >= 26:
+                if ctx.has_macd:
+                    fig_tech = _bb_macd_fig_skeleton()
                     # Bollinger Bands
                     st.markdown("### Bandas de Bollinger")
-                    if len(copper_hist) >= 20:
+                    if ctx.has_bb:
                         window = 20
-                        copper_hist['SMA'] = copper_hist['Close'].rolling(window=window).mean()
-                        copper_hist['STD'] = copper_hist['Close'].rolling(window=window).std()
-                        copper_hist['Upper Band'] = copper_hist['SMA'] + (copper_hist['STD'] * 2)
-                        copper_hist['Lower Band'] = copper_hist['SMA'] - (copper_hist['STD'] * 2)
+                        close_np = ctx.copper_close
+                        sma, std = rolling_mean_std(close_np, window)
+                        upper_np = sma + std * 2
+                        lower_np = sma - std * 2
                         try:
-                            latest_price = float(copper_hist['Close'].iloc[-1])
-                            latest_upper = float(copper_hist['Upper Band'].iloc[-1])
-                            latest_lower = float(copper_hist['Lower Band'].iloc[-1])
+                            # Últimos valores directamente de los arrays numpy, sin
+                            # pasar por el indexado de pandas
+                            latest_price = close_np[-1]
+                            latest_upper = upper_np[-1]
+                            latest_lower = lower_np[-1]
                             if np.isnan(latest_price) or np.isnan(latest_upper) or np.isnan(latest_lower):
                                 st.warning("Datos insuficientes o valores NaN en las Bandas de Bollinger.")
                             else:
@@ -598,34 +748,22 @@ with tab1:
                                     st.write("**Estado:** Sobreventa (el precio está por debajo de la banda inferior)")
                                 else:
                                     st.write("**Estado:** Dentro de las bandas (neutral)")
-                                fig_bb = go.Figure()
-                                fig_bb.add_trace(go.Scatter(x=copper_hist.index, y=copper_hist['Close'], name='Precio Cobre', line=dict(color='royalblue')))
-                                fig_bb.add_trace(go.Scatter(x=copper_hist.index, y=copper_hist['Upper Band'], name='Banda Superior', line=dict(color='red', dash='dash')))
-                                fig_bb.add_trace(go.Scatter(x=copper_hist.index, y=copper_hist['SMA'], name='Media Móvil (20)', line=dict(color='green')))
-                                fig_bb.add_trace(go.Scatter(x=copper_hist.index, y=copper_hist['Lower Band'], name='Banda Inferior', line=dict(color='red', dash='dash')))
-                                fig_bb.update_layout(
-                                    title="Bandas de Bollinger para el Cobre",
-                                    xaxis_title="Fecha",
-                                    yaxis_title="Precio (USD/lb)",
-                                    hovermode="x unified",
-                                    showlegend=True
-                                )
-                                st.plotly_chart(fig_bb, use_container_width=True, key="bollinger_chart")
+                                for trace, values in zip(fig_tech.data[:4], (close_np, upper_np, sma, lower_np)):
+                                    trace.x = copper_hist.index
+                                    trace.y = values
                         except Exception as e:
                             st.error(f"Error al calcular las Bandas de Bollinger: {e}")
                     else:
                         st.error("No se encontraron datos históricos suficientes para el cobre (mínimo 20 días).")
                     # MACD
                     st.markdown("### MACD (Convergencia/Divergencia de Medias Móviles)")
-                    if len(copper_hist) >= 26:
+                    if ctx.has_macd:
                         try:
-                            short_ema = copper_hist['Close'].ewm(span=12, adjust=False).mean()
-                            long_ema = copper_hist['Close'].ewm(span=26, adjust=False).mean()
-                            copper_hist['MACD'] = short_ema - long_ema
-                            copper_hist['Signal'] = copper_hist['MACD'].ewm(span=9, adjust=False).mean()
-                            copper_hist['Histogram'] = copper_hist['MACD'] - copper_hist['Signal']
-                            latest_macd = float(copper_hist['MACD'].iloc[-1])
-                            latest_signal = float(copper_hist['Signal'].iloc[-1])
+                            macd, signal, histogram = macd_kernel(
+                                ctx.copper_close, 2.0 / 13.0, 2.0 / 27.0, 2.0 / 10.0
+                            )
+                            latest_macd = float(macd[-1])
+                            latest_signal = float(signal[-1])
                             if np.isnan(latest_macd) or np.isnan(latest_signal):
                                 st.warning("Datos insuficientes o valores NaN en el cálculo del MACD.")
                             else:
@@ -633,22 +771,14 @@ with tab1:
                                     st.write("**Señal:** Alcista (MACD por encima de la línea de señal)")
                                 else:
                                     st.write("**Señal:** Bajista (MACD por debajo de la línea de señal)")
-                                fig_macd = go.Figure()
-                                fig_macd.add_trace(go.Scatter(x=copper_hist.index, y=copper_hist['MACD'], name='MACD', line=dict(color='blue')))
-                                fig_macd.add_trace(go.Scatter(x=copper_hist.index, y=copper_hist['Signal'], name='Línea de Señal', line=dict(color='orange')))
-                                fig_macd.add_trace(go.Bar(x=copper_hist.index, y=copper_hist['Histogram'], name='Histograma', marker_color='gray'))
-                                fig_macd.update_layout(
-                                    title="MACD para el Cobre",
-                                    xaxis_title="Fecha",
-                                    yaxis_title="Valor",
-                                    hovermode="x unified",
-                                    showlegend=True
-                                )
-                                st.plotly_chart(fig_macd, use_container_width=True, key="macd_chart")
+                                for trace, values in zip(fig_tech.data[4:], (macd, signal, histogram)):
+                                    trace.x = copper_hist.index
+                                    trace.y = values
                         except Exception as e:
                             st.error(f"Error al calcular el MACD: {e}")
                     else:
                         st.error("No se encontraron datos históricos suficientes para el MACD (mínimo 26 días).")
+                    st.plotly_chart(fig_tech, use_container_width=True, key="bb_macd")
                 else:
                     st.error("No se encontraron datos históricos del cobre o la columna 'Close' no está disponible.")
 
@@ -665,67 +795,70 @@ with tab1:
                         "EUR/CNY +5%": (copper_price, oil_price, eur_cny_price * 1.05, usd_cny_price),
                         "EUR/CNY -5%": (copper_price, oil_price, eur_cny_price * 0.95, usd_cny_price),
                     }
-                    sensitivity_results = {}
-                    for label, (c_p, o_p, e_c, u_c) in variations.items():
-                        _, _, _, _, copper_qty_ton, _, _, _, _ = calculate_order(
-                            budget_eur, copper_percentage, transport_cost_factor, c_p, o_p, e_c, u_c
-                        )
-                        sensitivity_results[label] = copper_qty_ton
-                    sens_df = pd.DataFrame.from_dict(sensitivity_results, orient="index", columns=["Toneladas de Cobre"])
-                    st.table(sens_df)
-                    fig_sens = go.Figure(go.Bar(
-                        x=sens_df.index,
-                        y=sens_df["Toneladas de Cobre"],
-                        marker_color="teal"
-                    ))
-                    fig_sens.update_layout(
-                        title="Impacto de ±5% en Variables Clave",
-                        xaxis_title="Escenario",
-                        yaxis_title="Toneladas de Cobre",
-                        hovermode="x unified"
+                    # Los seis escenarios empaquetados como arrays y una sola llamada
+                    # vectorizada en lugar de seis pasadas por el intérprete
+                    c_vec, o_vec, e_vec, u_vec = (np.array(v) for v in zip(*variations.values()))
+                    _, _, _, _, sensitivity_qtys, _, _, _, _ = calculate_order(
+                        budget_eur, copper_percentage, transport_cost_factor, c_vec, o_vec, e_vec, u_vec
                     )
+                    sens_df = pd.DataFrame({"Toneladas de Cobre": sensitivity_qtys}, index=list(variations))
+                    st.table(sens_df)
+                    fig_sens = _sens_fig_skeleton()
+                    fig_sens.data[0].x = list(sens_df.index)
+                    fig_sens.data[0].y = sensitivity_qtys
                     st.plotly_chart(fig_sens, use_container_width=True)
                     # Monte Carlo
                     st.markdown("### Simulación Monte Carlo (1000 escenarios a 4 meses)")
                     n_sim = 1000
-                    days_ahead = 80
-                    np.random.seed(42)
-                    pct_changes_copper = copper_hist["Close"].pct_change().dropna()
-                    vol_copper = np.std(pct_changes_copper) if len(pct_changes_copper) > 0 else 0.012
-                    pct_changes_oil = oil_hist["Close"].pct_change().dropna()
-                    vol_oil = np.std(pct_changes_oil) if len(pct_changes_oil) > 0 else 0.02
-                    pct_changes_eurcny = eur_cny_hist["Close"].pct_change().dropna()
-                    vol_eurcny = np.std(pct_changes_eurcny) if len(pct_changes_eurcny) > 0 else 0.004
-                    pct_changes_usdcny = usd_cny_hist["Close"].pct_change().dropna()
-                    vol_usdcny = np.std(pct_changes_usdcny) if len(pct_changes_usdcny) > 0 else 0.004
-                    sim_results = []
-                    for _ in range(n_sim):
-                        sim_copper = copper_price * np.exp(np.random.normal(0, vol_copper * np.sqrt(days_ahead)))
-                        sim_oil = oil_price * np.exp(np.random.normal(0, vol_oil * np.sqrt(days_ahead)))
-                        sim_eurcny = eur_cny_price * np.exp(np.random.normal(0, vol_eurcny * np.sqrt(days_ahead)))
-                        sim_usdcny = usd_cny_price * np.exp(np.random.normal(0, vol_usdcny * np.sqrt(days_ahead)))
+                    # Retornos diarios de las cuatro series con un único np.diff
+                    # sobre las vistas numpy, sin las Series de .pct_change().dropna()
+                    vol_mat = np.stack([hist_np[k] for k in ("Copper", "Oil", "EUR/CNY", "USD/CNY")])
+                    rets = np.diff(vol_mat, axis=1) / vol_mat[:, :-1]
+                    if rets.shape[1] > 0:
+                        vol_copper, vol_oil, vol_eurcny, vol_usdcny = np.std(rets, axis=1)
+                    else:
+                        vol_copper, vol_oil, vol_eurcny, vol_usdcny = 0.012, 0.02, 0.004, 0.004
+                    # Los 4×n_sim shocks de una vez en el buffer preasignado y una
+                    # única llamada vectorizada en lugar de 1000 iteraciones en Python
+                    shocks = _MC_RNG.standard_normal(out=_MC_SHOCKS)
+                    if HAVE_NUMBA:
+                        # Kernel nativo multihilo: shocks, exponenciales y cálculo del
+                        # pedido fusionados en una sola pasada por escenario
+                        sim_qty_ton = mc_qty(
+                            shocks,
+                            np.array([copper_price, oil_price, eur_cny_price, usd_cny_price]),
+                            np.array([vol_copper, vol_oil, vol_eurcny, vol_usdcny]),
+                            float(SQRT_DAYS_AHEAD), float(budget_eur), float(copper_percentage)
+                        )
+                    else:
+                        # Escalado y exponencial in situ sobre el buffer de shocks:
+                        # cero arrays temporales por simulación
+                        vols = np.array([vol_copper, vol_oil, vol_eurcny, vol_usdcny])
+                        shocks *= vols[:, None] * SQRT_DAYS_AHEAD
+                        np.exp(shocks, out=shocks)
                         _, _, _, _, sim_qty_ton, _, _, _, _ = calculate_order(
-                            budget_eur, copper_percentage, transport_cost_factor, sim_copper, sim_oil, sim_eurcny, sim_usdcny
+                            budget_eur, copper_percentage, transport_cost_factor,
+                            copper_price * shocks[0], oil_price * shocks[1],
+                            eur_cny_price * shocks[2], usd_cny_price * shocks[3]
                         )
-                        if not np.isnan(sim_qty_ton):
-                            sim_results.append(sim_qty_ton)
+                    sim_results = sim_qty_ton[~np.isnan(sim_qty_ton)]
                     if len(sim_results) > 0:
-                        mean_qty = np.mean(sim_results)
-                        std_qty = np.std(sim_results)
-                        min_qty = np.min(sim_results)
-                        max_qty = np.max(sim_results)
-                        p5 = np.percentile(sim_results, 5)
-                        p50 = np.median(sim_results)
-                        p95 = np.percentile(sim_results, 95)
+                        # Una sola ordenación para los cinco cuantiles más una pasada
+                        # de media/desviación, en lugar de siete recorridos del array
+                        min_qty, p5, p50, p95, max_qty = np.quantile(
+                            sim_results, [0.0, 0.05, 0.5, 0.95, 1.0]
+                        )
+                        mean_qty = sim_results.mean()
+                        std_qty = sim_results.std()
                         mc_summary = pd.DataFrame({
                             "Estadístico": ["Media", "Desviación Estándar", "Mínimo", "Percentil 5%", "Mediana", "Percentil 95%", "Máximo"],
-                            "Valor (ton)": [locale.format_string('%.2f', mean_qty, grouping=True),
-                                            locale.format_string('%.2f', std_qty, grouping=True),
-                                            locale.format_string('%.2f', min_qty, grouping=True),
-                                            locale.format_string('%.2f', p5, grouping=True),
-                                            locale.format_string('%.2f', p50, grouping=True),
-                                            locale.format_string('%.2f', p95, grouping=True),
-                                            locale.format_string('%.2f', max_qty, grouping=True)]
+                            "Valor (ton)": [fmt2(mean_qty),
+                                            fmt2(std_qty),
+                                            fmt2(min_qty),
+                                            fmt2(p5),
+                                            fmt2(p50),
+                                            fmt2(p95),
+                                            fmt2(max_qty)]
                         })
                         st.table(mc_summary)
                         # Histograma Monte Carlo
@@ -760,34 +893,40 @@ with tab2:
     purchase_date = st.date_input("Fecha de la compra pasada", value=datetime.now() - timedelta(days=30))
     sale_date = st.date_input("Fecha de venta ficticia", value=datetime.now() - timedelta(days=15), min_value=purchase_date)
     
+    @st.cache_data(ttl=3600, show_spinner=False)
+    def fetch_comparison_data(start_date, end_date):
+        # Una sola descarga para los tres tickers cubriendo ambas fechas; la caché
+        # hace que re-pulsar el botón no vuelva a tocar Yahoo
+        return yf.download(["HG=F", "EURCNY=X", "USDCNY=X"], start=start_date, end=end_date, interval="1d", auto_adjust=False, group_by="ticker", progress=False)
+
     if st.button("Analizar Comparación de Compra y Venta"):
-        def get_closest_data(ticker, target_date):
-            start_date = target_date - timedelta(days=10)
-            end_date = target_date + timedelta(days=10)
+        def get_closest_data(df_all, ticker, target_date):
             try:
-                df = yf.download(ticker, start=start_date, end=end_date, interval="1d", auto_adjust=False)
-                if df.empty:
+                closes = df_all[ticker]["Close"].dropna()
+                if closes.empty:
                     return np.nan
-                dates = df.index
                 target = pd.to_datetime(target_date)
-                diff = np.abs(dates - target)
+                diff = np.abs(closes.index - target)
                 closest_idx = diff.argmin()
-                return float(df.iloc[closest_idx]["Close"])
+                return float(closes.iloc[closest_idx])
             except Exception as e:
-                st.error(f"Error al descargar datos para {ticker}: {e}")
+                st.error(f"Error al extraer datos para {ticker}: {e}")
                 return np.nan
-        
+
         try:
-            copper_price_usd_past = get_closest_data("HG=F", purchase_date)
-            eur_cny_price_past = get_closest_data("EURCNY=X", purchase_date)
-            usd_cny_price_past = get_closest_data("USDCNY=X", purchase_date)
+            window_start = min(purchase_date, sale_date) - timedelta(days=10)
+            window_end = max(purchase_date, sale_date) + timedelta(days=10)
+            df_all = fetch_comparison_data(window_start, window_end)
+            copper_price_usd_past = get_closest_data(df_all, "HG=F", purchase_date)
+            eur_cny_price_past = get_closest_data(df_all, "EURCNY=X", purchase_date)
+            usd_cny_price_past = get_closest_data(df_all, "USDCNY=X", purchase_date)
             if any(np.isnan(x) for x in [copper_price_usd_past, eur_cny_price_past, usd_cny_price_past]):
                 st.warning("No se encontraron datos cercanos para la fecha de compra.")
             else:
                 copper_price_cny_past = copper_price_usd_past * usd_cny_price_past
-                copper_price_usd_sale = get_closest_data("HG=F", sale_date)
-                eur_cny_price_sale = get_closest_data("EURCNY=X", sale_date)
-                usd_cny_price_sale = get_closest_data("USDCNY=X", sale_date)
+                copper_price_usd_sale = get_closest_data(df_all, "HG=F", sale_date)
+                eur_cny_price_sale = get_closest_data(df_all, "EURCNY=X", sale_date)
+                usd_cny_price_sale = get_closest_data(df_all, "USDCNY=X", sale_date)
                 if any(np.isnan(x) for x in [copper_price_usd_sale, eur_cny_price_sale, usd_cny_price_sale]):
                     st.warning("No se encontraron datos cercanos para la fecha de venta ficticia.")
                 else:
@@ -796,22 +935,22 @@ with tab2:
                     comparison_df = pd.DataFrame({
                         "Métrica": ["Precio del cobre (USD/lb)", "Precio del cobre (CNY/lb)", "EUR/CNY", "USD/CNY"],
                         "Fecha de Compra ({})".format(purchase_date): [
-                            locale.format_string('%.2f', copper_price_usd_past, grouping=True),
-                            locale.format_string('%.2f', copper_price_cny_past, grouping=True),
-                            locale.format_string('%.4f', eur_cny_price_past, grouping=True),
-                            locale.format_string('%.4f', usd_cny_price_past, grouping=True)
+                            fmt2(copper_price_usd_past),
+                            fmt2(copper_price_cny_past),
+                            fmt4(eur_cny_price_past),
+                            fmt4(usd_cny_price_past)
                         ],
                         "Fecha de Venta ({})".format(sale_date): [
-                            locale.format_string('%.2f', copper_price_usd_sale, grouping=True),
-                            locale.format_string('%.2f', copper_price_cny_sale, grouping=True),
-                            locale.format_string('%.4f', eur_cny_price_sale, grouping=True),
-                            locale.format_string('%.4f', usd_cny_price_sale, grouping=True)
+                            fmt2(copper_price_usd_sale),
+                            fmt2(copper_price_cny_sale),
+                            fmt4(eur_cny_price_sale),
+                            fmt4(usd_cny_price_sale)
                         ],
                         "Diferencia (Venta - Compra)": [
-                            locale.format_string('%.2f', copper_price_usd_sale - copper_price_usd_past, grouping=True),
-                            locale.format_string('%.2f', copper_price_cny_sale - copper_price_cny_past, grouping=True),
-                            locale.format_string('%.4f', eur_cny_price_sale - eur_cny_price_past, grouping=True),
-                            locale.format_string('%.4f', usd_cny_price_sale - usd_cny_price_past, grouping=True)
+                            fmt2(copper_price_usd_sale - copper_price_usd_past),
+                            fmt2(copper_price_cny_sale - copper_price_cny_past),
+                            fmt4(eur_cny_price_sale - eur_cny_price_past),
+                            fmt4(usd_cny_price_sale - usd_cny_price_past)
                         ]
                     })
                     st.table(comparison_df)
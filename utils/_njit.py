@@ -0,0 +1,25 @@
+"""Decorador njit con numba opcional.
+
+Si numba está instalado, los kernels numéricos se compilan a código nativo;
+si no, se ejecutan como Python puro con la misma semántica (más lentos,
+pero sin convertir numba en dependencia obligatoria).
+"""
+
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        # Soporta tanto @njit como @njit(cache=True, ...) sin numba
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+
+        def wrapper(func):
+            return func
+
+        return wrapper
+
+    def prange(*args):
+        return range(*args)
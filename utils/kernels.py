@@ -0,0 +1,200 @@
+"""Kernels numéricos del panel (compilados a código nativo si numba está disponible).
+
+Viven en su propio módulo para que la compilación ocurra una sola vez por
+proceso: Streamlit re-ejecuta panel.py en cada rerun, pero los módulos
+importados quedan cacheados en sys.modules, así que los dispatchers ya
+compilados se reutilizan sin volver a pasar por los decoradores. Las firmas
+explícitas fuerzan la compilación en el import, que con cache=True se sirve
+del objeto cacheado en disco: el primer rerun no paga el JIT.
+"""
+
+import numpy as np
+
+from ._njit import njit, prange
+
+
+@njit("f8(f8[:], i8)", cache=True)
+def rsi_loop(close, period):
+    # RSI de Wilder en una sola pasada sobre el array de cierres
+    n = close.size
+    avg_gain = 0.0
+    avg_loss = 0.0
+    for i in range(1, period + 1):
+        delta = close[i] - close[i - 1]
+        if delta > 0:
+            avg_gain += delta
+        else:
+            avg_loss -= delta
+    avg_gain /= period
+    avg_loss /= period
+    for i in range(period + 1, n):
+        delta = close[i] - close[i - 1]
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        avg_gain = (avg_gain * (period - 1) + gain) / period
+        avg_loss = (avg_loss * (period - 1) + loss) / period
+    if avg_loss == 0.0:
+        return 100.0
+    return 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+
+@njit("f8[:](f8[:], i8[:])", cache=True)
+def rsi_multi(close, periods):
+    # Varios períodos de RSI compartiendo una única pasada sobre las diferencias
+    d = np.empty(close.size - 1)
+    for i in range(close.size - 1):
+        d[i] = close[i + 1] - close[i]
+    out = np.empty(periods.size)
+    for j in range(periods.size):
+        p = periods[j]
+        avg_gain = 0.0
+        avg_loss = 0.0
+        for i in range(p):
+            if d[i] > 0:
+                avg_gain += d[i]
+            else:
+                avg_loss -= d[i]
+        avg_gain /= p
+        avg_loss /= p
+        for i in range(p, d.size):
+            gain = d[i] if d[i] > 0 else 0.0
+            loss = -d[i] if d[i] < 0 else 0.0
+            avg_gain = (avg_gain * (p - 1) + gain) / p
+            avg_loss = (avg_loss * (p - 1) + loss) / p
+        out[j] = 100.0 if avg_loss == 0.0 else 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+    return out
+
+
+@njit("UniTuple(f8, 2)(f8[:], i8)", cache=True)
+def ema_tail_std(x, span):
+    # EMA recursiva (adjust=False) y desviación típica muestral (Welford)
+    # avanzando juntas: una única pasada sobre la cola, sin construir Series
+    alpha = 2.0 / (span + 1.0)
+    e = x[0]
+    mean = x[0]
+    m2 = 0.0
+    for i in range(1, x.size):
+        v = x[i]
+        e = alpha * v + (1.0 - alpha) * e
+        delta = v - mean
+        mean += delta / (i + 1)
+        m2 += delta * (v - mean)
+    return e, np.sqrt(m2 / (x.size - 1))
+
+
+@njit("UniTuple(f8[:], 2)(f8[:, :], i8)", cache=True)
+def ema_tail_std_batch(mat, span):
+    # EMA y desviación de las cuatro series apiladas en una sola llamada,
+    # en lugar de un despacho de Python por variable
+    k = mat.shape[0]
+    emas = np.empty(k)
+    stds = np.empty(k)
+    for r in range(k):
+        e, s = ema_tail_std(np.ascontiguousarray(mat[r]), span)
+        emas[r] = e
+        stds[r] = s
+    return emas, stds
+
+
+@njit("UniTuple(f8[:], 2)(f8[:], i8)", cache=True)
+def rolling_mean_std(x, window):
+    # Media y desviación móviles en O(n) manteniendo suma y suma de cuadrados
+    # (entra un valor, sale otro), en lugar del rolling genérico de pandas
+    n = x.size
+    mean = np.full(n, np.nan)
+    std = np.full(n, np.nan)
+    s = 0.0
+    s2 = 0.0
+    for i in range(n):
+        v = x[i]
+        s += v
+        s2 += v * v
+        if i >= window:
+            old = x[i - window]
+            s -= old
+            s2 -= old * old
+        if i >= window - 1:
+            m = s / window
+            var = (s2 - window * m * m) / (window - 1)
+            if var < 0.0:
+                var = 0.0
+            mean[i] = m
+            std[i] = np.sqrt(var)
+    return mean, std
+
+
+@njit("UniTuple(f8[:], 3)(f8[:], f8, f8, f8)", cache=True)
+def macd_kernel(close, alpha_short, alpha_long, alpha_signal):
+    # Las tres EMAs (12, 26 y señal de 9) avanzan juntas en una única pasada,
+    # sin las Series intermedias de los tres .ewm() de pandas
+    n = close.size
+    macd = np.empty(n)
+    signal = np.empty(n)
+    hist = np.empty(n)
+    e_short = close[0]
+    e_long = close[0]
+    e_signal = 0.0
+    for i in range(n):
+        v = close[i]
+        if i > 0:
+            e_short = alpha_short * v + (1.0 - alpha_short) * e_short
+            e_long = alpha_long * v + (1.0 - alpha_long) * e_long
+        m = e_short - e_long
+        if i == 0:
+            e_signal = m
+        else:
+            e_signal = alpha_signal * m + (1.0 - alpha_signal) * e_signal
+        macd[i] = m
+        signal[i] = e_signal
+        hist[i] = m - e_signal
+    return macd, signal, hist
+
+
+@njit("f8[:](f8[:, :], f8[:], f8[:], f8, f8, f8)", parallel=True, fastmath=True, cache=True)
+def mc_qty(shocks, prices, vols, sqrt_horizon, budget_eur, copper_pct):
+    # Toneladas comprables por escenario con el cálculo de calculate_order
+    # inline; el petróleo solo afecta a costes, no al tonelaje, así que no
+    # entra en el kernel. prices/vols: [cobre, petróleo, EUR/CNY, USD/CNY]
+    n = shocks.shape[1]
+    out = np.empty(n)
+    for k in prange(n):
+        sim_copper = prices[0] * np.exp(vols[0] * sqrt_horizon * shocks[0, k])
+        sim_eurcny = prices[2] * np.exp(vols[2] * sqrt_horizon * shocks[2, k])
+        sim_usdcny = prices[3] * np.exp(vols[3] * sqrt_horizon * shocks[3, k])
+        copper_budget_cny = budget_eur * sim_eurcny * (copper_pct / 100.0)
+        copper_price_cny = sim_copper * sim_usdcny
+        if copper_price_cny != 0.0:
+            out[k] = copper_budget_cny / copper_price_cny * 0.000453592
+        else:
+            out[k] = np.nan
+    return out
+
+
+@njit("f8[:, :](f8[:], f8[:], f8[:], f8[:], f8, f8, f8)", cache=True, fastmath=True)
+def hist_orders(copper, oil, eur_cny, usd_cny, budget_eur, copper_pct, transport_factor):
+    # Todas las columnas derivadas del pedido en una sola pasada fusionada
+    n = copper.size
+    out = np.empty((n, 10))
+    for i in range(n):
+        budget_cny = budget_eur * eur_cny[i]
+        copper_budget_cny = budget_cny * (copper_pct / 100.0)
+        other_budget_cny = budget_cny * (1.0 - copper_pct / 100.0)
+        copper_price_cny = copper[i] * usd_cny[i]
+        transport_cost_cny = oil[i] * usd_cny[i] * (transport_factor / 100.0)
+        other_cost_cny = other_budget_cny - transport_cost_cny
+        if other_cost_cny < 0.0:
+            other_cost_cny = 0.0
+        copper_quantity_lb = copper_budget_cny / copper_price_cny
+        copper_quantity_ton = copper_quantity_lb * 0.000453592
+        total_order_cost_cny = copper_budget_cny + transport_cost_cny + other_cost_cny
+        out[i, 0] = budget_cny
+        out[i, 1] = copper_budget_cny
+        out[i, 2] = other_budget_cny
+        out[i, 3] = copper_price_cny
+        out[i, 4] = transport_cost_cny
+        out[i, 5] = other_cost_cny
+        out[i, 6] = copper_quantity_lb
+        out[i, 7] = copper_quantity_ton
+        out[i, 8] = total_order_cost_cny
+        out[i, 9] = budget_cny - total_order_cost_cny
+    return out